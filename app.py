@@ -1,9 +1,11 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from slowapi.errors import RateLimitExceeded
 from starlette.requests import Request
 from starlette.responses import JSONResponse
 
 from deps import limiter
+from inference import run_in_pool, warm_up
 from middleware import MaxSizeMiddleware
 from metrics import MetricsMiddleware
 
@@ -24,6 +26,7 @@ app = FastAPI(
     version="1.0.0",
     contact={"name": "Juan Pablo Cruz", "email": "juanpablocruzmaseda@gmail.com"},
     license_info={"name": "MIT", "url": "https://opensource.org/licenses/MIT"},
+    default_response_class=ORJSONResponse,
 )
 
 app.state.limiter = limiter
@@ -32,6 +35,11 @@ app.add_middleware(MetricsMiddleware)
 app.add_middleware(SlowAPIMiddleware)
 
 
+@app.on_event("startup")
+async def warm_up_analyzer():
+    await run_in_pool(warm_up)
+
+
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     return JSONResponse(
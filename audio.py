@@ -0,0 +1,84 @@
+import io
+import os
+
+import numpy as np
+import soundfile as sf
+import soxr
+from numba import njit, types
+
+SAMPLE_RATE = 48000  # BirdNET's native sample rate
+
+# Silence/noise gate applied before BirdNET. Audio is checked in 3 s chunks (one
+# BirdNET window) and kept if any chunk has an RMS of at least GATE_MIN_RMS
+# (1e-4 ≈ -80 dBFS) and a GATE_FFT_SIZE-sample frame that isn't noise-like, i.e.
+# whose spectral flatness within BirdNET's 150 Hz-15 kHz band is at most
+# GATE_MAX_FLATNESS (white noise sits around 0.56, tonal bird song far lower).
+# Streaming windows are always gated; whole uploads only with GATE_UPLOADS set,
+# since a faint call over broadband noise can still read as noise-like. Set
+# GATE_MIN_RMS / GATE_MAX_FLATNESS to 0 / 1 to disable it.
+GATE_MIN_RMS = float(os.getenv("BIRDNET_GATE_MIN_RMS", "1e-4"))
+GATE_MAX_FLATNESS = float(os.getenv("BIRDNET_GATE_MAX_FLATNESS", "0.5"))
+GATE_UPLOADS = os.getenv("BIRDNET_GATE_UPLOADS", "").lower() in ("1", "true", "yes")
+GATE_CHUNK_SIZE = SAMPLE_RATE * 3
+GATE_FFT_SIZE = 2048
+_GATE_WINDOW = np.hanning(GATE_FFT_SIZE).astype(np.float32)
+_GATE_BAND = slice(
+    150 * GATE_FFT_SIZE // SAMPLE_RATE, 15000 * GATE_FFT_SIZE // SAMPLE_RATE + 1
+)
+
+
+def decode_audio(data: bytes) -> np.ndarray:
+    """
+    Decodes an in-memory audio file with libsndfile and returns a mono float32
+    signal resampled to SAMPLE_RATE.
+
+    Raises soundfile.LibsndfileError if the format can't be read.
+    """
+    samples, rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=False)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1, dtype=np.float32)
+    if rate != SAMPLE_RATE:
+        samples = soxr.resample(samples, rate, SAMPLE_RATE)
+    return samples
+
+
+def is_silent(samples: np.ndarray) -> bool:
+    """
+    Returns True if no 3 s chunk of `samples` is loud and tonal enough to
+    contain a vocalization worth running BirdNET on. Chunks are checked one at a
+    time so long uploads don't allocate full-size copies.
+    """
+    for start in range(0, samples.size, GATE_CHUNK_SIZE):
+        chunk = samples[start : start + GATE_CHUNK_SIZE]
+        if np.sqrt(np.dot(chunk, chunk) / chunk.size) < GATE_MIN_RMS:
+            continue
+        n_frames = chunk.size // GATE_FFT_SIZE
+        if n_frames == 0:
+            return False
+        frames = chunk[: n_frames * GATE_FFT_SIZE].reshape(n_frames, GATE_FFT_SIZE)
+        spec = np.fft.rfft(frames * _GATE_WINDOW, axis=1)[:, _GATE_BAND]
+        power = spec.real**2 + spec.imag**2 + np.float32(1e-12)
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+        # One tonal frame is enough to keep the signal.
+        if (flatness <= GATE_MAX_FLATNESS).any():
+            return False
+    return True
+
+
+# Explicit signatures make Numba compile (or load from cache) at import time, so
+# the first streaming window doesn't stall the event loop on JIT compilation.
+_PCM16_SIGNATURES = [
+    types.void(types.Array(types.int16, 1, "C"), types.float32[::1]),
+    types.void(types.Array(types.int16, 1, "C", readonly=True), types.float32[::1]),
+]
+
+
+@njit(_PCM16_SIGNATURES, cache=True, fastmath=True, nogil=True)
+def pcm16_to_float32(src: np.ndarray, dst: np.ndarray) -> None:
+    """
+    Converts 16-bit PCM samples in `src` to float32 in [-1, 1), writing into the
+    first `src.size` slots of the preallocated `dst`.
+    """
+    scale = np.float32(1.0 / 32768.0)
+    for i in range(src.size):
+        dst[i] = src[i] * scale
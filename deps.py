@@ -1,22 +1,82 @@
 import os
 from datetime import datetime, timezone
 
-from birdnetlib.analyzer import Analyzer
 from dotenv import load_dotenv
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
 load_dotenv()
 
+# With several uvicorn workers on one host, keep TensorFlow/OpenMP from each
+# spawning a thread per core. These must be set before TensorFlow is imported.
+if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+    for var in ("TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS", "OMP_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+
+import redis
+from birdnetlib.analyzer import Analyzer
+from cachetools import LRUCache
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
 start_time = datetime.now(timezone.utc)
 
 EXPECTED_TOKEN = os.getenv("BIRDNET_API_KEY", "")
 if not EXPECTED_TOKEN:
     raise RuntimeError("Environment variable BIRDNET_API_KEY is not set")
 
-analyzer = Analyzer()
+
+class ModelPathAnalyzer(Analyzer):
+    """
+    Analyzer that loads its BirdNET classifier from `model_path` instead of the
+    FP32 model bundled with birdnetlib, e.g. BirdNET_GLOBAL_6K_V2.4_Model_INT8.tflite.
+    The model must use the bundled 6K label set; location filtering is unchanged.
+    """
+
+    def __init__(self, model_path: str, **kwargs):
+        self.override_model_path = model_path
+        super().__init__(**kwargs)
+
+    def load_model(self):
+        self.model_path = self.override_model_path
+        super().load_model()
+
+
+BIRDNET_MODEL_PATH = os.getenv("BIRDNET_MODEL_PATH", "")
+if BIRDNET_MODEL_PATH:
+    analyzer = ModelPathAnalyzer(BIRDNET_MODEL_PATH)
+else:
+    analyzer = Analyzer()
+
+# birdnetlib memoizes the location/week species list per exact (lon, lat, week_48)
+# in a plain dict that grows forever; bound it. Callers round coordinates to
+# SPECIES_GRID_DECIMALS so nearby requests share an entry.
+SPECIES_GRID_DECIMALS = 2
+analyzer.cached_species_lists = LRUCache(
+    maxsize=int(os.getenv("BIRDNET_SPECIES_CACHE_SIZE", 1024))
+)
 
 TMP_DIR = "/tmp/birdnet_uploads"
 os.makedirs(TMP_DIR, exist_ok=True)
 
-limiter = Limiter(key_func=get_remote_address)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# One connection pool per worker, shared by the rate limiter, the detection cache
+# and the health check. Short timeouts keep an unreachable Redis from stalling
+# requests; every caller treats Redis as optional.
+redis_pool = redis.ConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=64,
+    socket_keepalive=True,
+    socket_connect_timeout=1.0,
+    socket_timeout=1.0,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+# Counters live in Redis so every worker and replica enforces the same limit.
+# If Redis is unreachable, slowapi falls back to per-process in-memory counters.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=REDIS_URL,
+    storage_options={"connection_pool": redis_pool},
+    strategy="moving-window",
+    in_memory_fallback_enabled=True,
+)
@@ -0,0 +1,36 @@
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# One worker per CPU this container may use (os.cpu_count() is the host's).
+if hasattr(os, "sched_getaffinity"):
+    _cpus = sorted(os.sched_getaffinity(0))
+else:
+    _cpus = list(range(os.cpu_count() or 1))
+workers = int(os.getenv("WEB_CONCURRENCY", len(_cpus)))
+# Picks up uvloop and httptools automatically when they are installed.
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# deps.py reads WEB_CONCURRENCY to cap each worker's TF/OpenMP thread pools.
+os.environ.setdefault("WEB_CONCURRENCY", str(workers))
+
+
+def pre_fork(server, worker):
+    """
+    Assigns each worker a CPU in the master, before it forks, so concurrent
+    spawns can't race for the same one. A respawned worker gets a CPU no live
+    sibling holds, i.e. the one its predecessor had.
+    """
+    taken = {getattr(w, "cpu", None) for w in server.WORKERS.values()}
+    free = [cpu for cpu in _cpus if cpu not in taken]
+    worker.cpu = free[0] if free else _cpus[worker.age % len(_cpus)]
+
+
+def post_fork(server, worker):
+    """
+    Pins each worker to its CPU so N workers share N cores without their
+    inference threads migrating or oversubscribing.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    os.sched_setaffinity(0, {worker.cpu})
+    server.log.info("Worker %s pinned to CPU %d", worker.pid, worker.cpu)
@@ -0,0 +1,130 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as dtDate
+
+import numpy as np
+from birdnetlib import Recording, RecordingBuffer
+
+from audio import SAMPLE_RATE, is_silent
+from deps import SPECIES_GRID_DECIMALS, analyzer
+
+# Admits BirdNET jobs (across all requests and streams) to the pool. analyzer_lock
+# already serializes inference, so the default of 1 keeps waiting jobs queued here
+# in FIFO order instead of parking pool threads on the (unfair) lock.
+INFERENCE_CONCURRENCY = int(os.getenv("BIRDNET_CONCURRENCY", 1))
+inference_semaphore = asyncio.Semaphore(INFERENCE_CONCURRENCY)
+
+# The pool also decodes uploads and talks to Redis, so it gets a few threads
+# beyond the inference slots; a cache hit shouldn't queue behind an analysis.
+# It isn't sized from the CPU count: gunicorn_conf.py pins each worker to one CPU.
+ANALYSIS_WORKERS = int(os.getenv("BIRDNET_WORKERS", INFERENCE_CONCURRENCY + 4))
+
+analysis_pool = ThreadPoolExecutor(
+    max_workers=ANALYSIS_WORKERS, thread_name_prefix="birdnet"
+)
+
+# The shared Analyzer keeps per-call state (results, species list) and wraps a
+# single TFLite interpreter, neither of which is safe to use from two threads.
+analyzer_lock = threading.Lock()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """
+    Runs a blocking callable on the analysis thread pool without blocking the
+    event loop, and returns its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        analysis_pool, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_inference(func, *args, **kwargs):
+    """
+    Runs a BirdNET call on the analysis pool once an inference slot is free.
+    """
+    async with inference_semaphore:
+        return await run_in_pool(func, *args, **kwargs)
+
+
+def to_grid(coordinate: float) -> float:
+    """
+    Rounds a latitude/longitude so it hits the analyzer's cached species lists.
+    Coordinates that would round to 0 are returned unrounded, since birdnetlib
+    treats a 0 latitude or longitude as "no location".
+    """
+    return round(coordinate, SPECIES_GRID_DECIMALS) or coordinate
+
+
+def _analyze(rec: Recording | RecordingBuffer) -> list[dict]:
+    """
+    Analyzes `rec` on the shared analyzer and returns its detections.
+    """
+    with analyzer_lock:
+        # birdnetlib only rebuilds the species list when both lat and lon are
+        # truthy, so without this a recording at 0 would be filtered against the
+        # previous request's list.
+        if not (rec.lat and rec.lon):
+            analyzer.custom_species_list = []
+        rec.analyze()
+        return rec.detections
+
+
+def run_birdnet_on_file(
+    file_path: str, lat: float, lon: float, date: dtDate, min_conf: float
+) -> list[dict]:
+    """
+    Runs BirdNET detection on an audio file and returns a list of detection results.
+    """
+    rec = Recording(
+        analyzer,
+        file_path,
+        lat=to_grid(lat),
+        lon=to_grid(lon),
+        date=date,
+        min_conf=min_conf,
+    )
+    return _analyze(rec)
+
+
+def run_birdnet_on_samples(
+    samples: np.ndarray,
+    rate: int,
+    lat: float,
+    lon: float,
+    date: dtDate,
+    min_conf: float,
+    gate: bool = True,
+) -> list[dict]:
+    """
+    Runs BirdNET detection on an in-memory mono float32 signal and returns a
+    list of detection results. With `gate`, silent or noise-only signals are
+    skipped.
+    """
+    if gate and is_silent(samples):
+        return []
+    rec = RecordingBuffer(
+        analyzer,
+        samples,
+        rate,
+        lat=to_grid(lat),
+        lon=to_grid(lon),
+        date=date,
+        min_conf=min_conf,
+    )
+    return _analyze(rec)
+
+
+def warm_up() -> None:
+    """
+    Runs one silent 3 s window through the analyzer so the first real request
+    doesn't pay for the interpreter's first invocation.
+    """
+    rec = RecordingBuffer(
+        analyzer, np.zeros(SAMPLE_RATE * 3, dtype=np.float32), SAMPLE_RATE, min_conf=0.99
+    )
+    with analyzer_lock:
+        rec.analyze()
@@ -1,8 +1,10 @@
+import asyncio
 from datetime import datetime, timezone
+import redis
 from fastapi import APIRouter
 from starlette.responses import JSONResponse
 
-from deps import start_time, analyzer
+from deps import start_time, analyzer, redis_client
 from metrics import metrics_endpoint
 
 router = APIRouter(tags=["monitoring"])
@@ -14,15 +16,22 @@ async def health():
       - status: "ok"
       - uptime_seconds: seconds since app start
       - model_loaded: true if the BirdNET Analyzer instance exists
+      - redis_connected: true if Redis (rate limits, detection cache) answers a PING
     """
     now = datetime.now(timezone.utc)
     uptime_seconds = (now - start_time).total_seconds()
     model_loaded = analyzer is not None
+    # Pinged off the analysis pool so probes never wait behind BirdNET work.
+    try:
+        redis_connected = bool(await asyncio.to_thread(redis_client.ping))
+    except redis.RedisError:
+        redis_connected = False
     return JSONResponse(
         content={
             "status": "ok",
             "uptime_seconds": uptime_seconds,
             "model_loaded": model_loaded,
+            "redis_connected": redis_connected,
         }
     )
 
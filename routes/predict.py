@@ -1,19 +1,204 @@
+import logging
 import os
-import shutil
+import time
 import uuid
-from datetime import datetime, timezone
+from datetime import date as date_type, datetime, timezone
 from typing import Annotated, List, Optional
 
-from birdnetlib import Recording
+import aiofiles
+import msgpack
+import redis
+import soundfile as sf
+from cachetools import LRUCache
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile, status
 from pydantic import Field
+from xxhash import xxh3_64_intdigest
 
-from deps import analyzer, TMP_DIR, limiter
+from audio import GATE_UPLOADS, SAMPLE_RATE, decode_audio
+from deps import BIRDNET_MODEL_PATH, TMP_DIR, limiter, redis_client
 from auth import verify_bearer_token
+from inference import (
+    run_birdnet_on_file,
+    run_birdnet_on_samples,
+    run_in_pool,
+    run_inference,
+    to_grid,
+)
 from models import Detection
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/predict", tags=["predict"])
 
+# Raw detections keyed by (audio hash, date, gridded lat, gridded lon). Uploads are
+# analyzed at CACHE_MIN_CONF (or lower, if asked) so that a cached entry can be
+# re-filtered for any stricter `min_conf` without running BirdNET again. Entries
+# are kept in a per-worker LRU and, with BIRDNET_CACHE_REDIS enabled, mirrored to
+# Redis for CACHE_TTL seconds so other workers and replicas can reuse them. After
+# a Redis error the mirror is skipped for CACHE_REDIS_BACKOFF seconds, so an
+# unreachable Redis doesn't add a socket timeout to every upload.
+CACHE_MIN_CONF = 0.1
+CACHE_TTL = int(os.getenv("BIRDNET_CACHE_TTL", 3600))
+CACHE_REDIS = os.getenv("BIRDNET_CACHE_REDIS", "").lower() in ("1", "true", "yes")
+CACHE_REDIS_BACKOFF = 30.0
+_detection_cache: LRUCache = LRUCache(maxsize=int(os.getenv("BIRDNET_CACHE_SIZE", 256)))
+_redis_retry_at = 0.0
+
+
+def _redis_key(key: tuple) -> str:
+    # Detections depend on the model, so replicas running different models
+    # mustn't share entries.
+    model = BIRDNET_MODEL_PATH or "default"
+    return f"birdnet:detections:{model}:" + ":".join(str(part) for part in key)
+
+
+def _shared_available() -> bool:
+    return CACHE_REDIS and time.monotonic() >= _redis_retry_at
+
+
+def _redis_failed(action: str, e: Exception) -> None:
+    global _redis_retry_at
+    _redis_retry_at = time.monotonic() + CACHE_REDIS_BACKOFF
+    logger.warning(
+        "Detection cache %s failed, skipping Redis for %.0fs: %s",
+        action,
+        CACHE_REDIS_BACKOFF,
+        e,
+    )
+
+
+def _load_shared(key: tuple) -> Optional[tuple]:
+    """
+    Fetches a cached (analysis_conf, detections) entry from Redis. Returns None
+    if it's missing, unreadable or Redis is unavailable.
+    """
+    try:
+        raw = redis_client.get(_redis_key(key))
+    except redis.RedisError as e:
+        _redis_failed("lookup", e)
+        return None
+    if raw is None:
+        return None
+    try:
+        analysis_conf, detections = msgpack.unpackb(raw, raw=False)
+    except (msgpack.UnpackException, ValueError, TypeError) as e:
+        logger.warning("Ignoring unreadable detection cache entry: %s", e)
+        return None
+    if not isinstance(analysis_conf, (int, float)) or not isinstance(detections, list):
+        logger.warning("Ignoring malformed detection cache entry")
+        return None
+    return analysis_conf, detections
+
+
+def _store_shared(key: tuple, entry: tuple) -> None:
+    """
+    Stores a (analysis_conf, detections) entry in Redis. Failures are logged and ignored.
+    """
+    try:
+        redis_client.set(_redis_key(key), msgpack.packb(entry), ex=CACHE_TTL)
+    except redis.RedisError as e:
+        _redis_failed("store", e)
+
+
+async def _save_bytes(data: bytes, path: str) -> None:
+    """
+    Writes raw bytes to `path` without blocking the event loop.
+    """
+    async with aiofiles.open(path, "wb") as out_f:
+        await out_f.write(data)
+
+
+async def _analyze_bytes(
+    data: bytes,
+    filename: str,
+    lat: float,
+    lon: float,
+    recording_date: date_type,
+    min_conf: float,
+) -> List[dict]:
+    """
+    Decodes `data` in memory and runs BirdNET on the samples. Formats libsndfile
+    can't read fall back to a temp file named after `filename`, decoded by BirdNET.
+    """
+    try:
+        samples = await run_in_pool(decode_audio, data)
+    except sf.LibsndfileError:
+        samples = None
+
+    if samples is not None:
+        return await run_inference(
+            run_birdnet_on_samples,
+            samples,
+            SAMPLE_RATE,
+            lat,
+            lon,
+            recording_date,
+            min_conf,
+            gate=GATE_UPLOADS,
+        )
+
+    tmp_path = os.path.join(TMP_DIR, f"{uuid.uuid4().hex}_{filename}")
+    await _save_bytes(data, tmp_path)
+    try:
+        return await run_inference(
+            run_birdnet_on_file, tmp_path, lat, lon, recording_date, min_conf
+        )
+    finally:
+        os.remove(tmp_path)
+
+
+async def _detect(
+    data: bytes,
+    filename: str,
+    lat: float,
+    lon: float,
+    recording_date: date_type,
+    min_conf: float,
+) -> List[dict]:
+    """
+    Returns raw detections from an analysis run at or below `min_conf`, reusing an
+    earlier one for the same audio, date and (rounded) location when possible.
+    Callers still have to drop detections at or below `min_conf`.
+    """
+    key = (
+        xxh3_64_intdigest(data),
+        recording_date.toordinal(),
+        to_grid(lat),
+        to_grid(lon),
+    )
+    cached = _detection_cache.get(key)
+    if cached is None and _shared_available():
+        cached = await run_in_pool(_load_shared, key)
+        if cached is not None:
+            _detection_cache[key] = cached
+    if cached is None or cached[0] > min_conf:
+        analysis_conf = min(min_conf, CACHE_MIN_CONF)
+        detections = await _analyze_bytes(
+            data, filename, lat, lon, recording_date, analysis_conf
+        )
+        cached = _detection_cache[key] = (analysis_conf, detections)
+        if _shared_available():
+            await run_in_pool(_store_shared, key, cached)
+    return cached[1]
+
+
+def _best_per_species(detections: List[dict], min_conf: float) -> List[dict]:
+    """
+    Drops detections at or below `min_conf` (clamped to [0.01, 0.99] as birdnetlib
+    does), keeps the highest-confidence detection for each `scientific_name` in a
+    single pass and returns them sorted by confidence (descending).
+    """
+    threshold = max(0.01, min(min_conf, 0.99))
+    best: dict[str, dict] = {}
+    for det in detections:
+        if det["confidence"] <= threshold:
+            continue
+        species = det["scientific_name"]
+        current = best.get(species)
+        if current is None or det["confidence"] > current["confidence"]:
+            best[species] = det
+    return sorted(best.values(), key=lambda d: d["confidence"], reverse=True)
+
 @router.post(
     "/file",
     summary="Upload a mono audio file and receive one detection per species (highest confidence)",
@@ -70,20 +255,17 @@ async def predict_from_file(
     ] = Form(0.25),
 ) -> List[Detection]:
     """
-    1) Save uploaded file to a temp path.
+    1) Read the uploaded file into memory.
     2) If `date` is None, use today's UTC date.
-    3) Run BirdNET analysis (raw detections = multiple per species/time segment).
-    4) Sort raw detections by confidence (descending).
-    5) Group by `scientific_name`, keeping only the highest-confidence detection per species.
-    6) Return a list of Detection objects (one per species).
+    3) Decode in memory and run BirdNET analysis (raw detections = multiple per
+       species/time segment). Formats libsndfile can't decode go through a temp file.
+    4) Group by `scientific_name`, keeping only the highest-confidence detection per species.
+    5) Return a list of Detection objects (one per species), sorted by confidence.
     """
-    unique_name = f"{uuid.uuid4().hex}_{file.filename}"
-    tmp_path = os.path.join(TMP_DIR, unique_name)
     try:
-        with open(tmp_path, "wb") as out_f:
-            shutil.copyfileobj(file.file, out_f)
+        data = await file.read()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save uploaded file: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to read uploaded file: {e}")
 
     if date is None:
         recording_date = datetime.now(timezone.utc).date()
@@ -91,30 +273,13 @@ async def predict_from_file(
         recording_date = date.date() if isinstance(date, datetime) else date
 
     try:
-        rec = Recording(
-            analyzer,
-            tmp_path,
-            lat=lat,
-            lon=lon,
-            date=recording_date,
-            min_conf=min_conf,
+        detections = await _detect(
+            data, file.filename or "upload", lat, lon, recording_date, min_conf
         )
-        rec.analyze()
-        detections = rec.detections
     except Exception as e:
-        os.remove(tmp_path)
         raise HTTPException(status_code=500, detail=f"BirdNET analysis failed: {e}")
 
-    os.remove(tmp_path)
-
-    sorted_detections = sorted(detections, key=lambda d: d["confidence"], reverse=True)
-    best_per_species: dict[str, dict] = {}
-    for det in sorted_detections:
-        species = det["scientific_name"]
-        if species not in best_per_species:
-            best_per_species[species] = det
-
-    return [Detection(**det) for det in best_per_species.values()]
+    return [Detection.model_construct(**det) for det in _best_per_species(detections, min_conf)]
 
 
 @router.post(
@@ -136,7 +301,7 @@ async def predict_from_stream(
         ...,
         description=(
             "Raw WAV byte stream (16-bit little-endian, mono). Must include a valid "
-            "WAV header for BirdNET’s ffmpeg/librosa to decode."
+            "WAV header so it can be decoded."
         ),
     ),
     lat: Annotated[
@@ -172,48 +337,22 @@ async def predict_from_stream(
     ] = Form(0.25),
 ) -> List[Detection]:
     """
-    1) Write raw WAV bytes to a temp .wav file.
-    2) If `date` is None, use today's UTC date.
-    3) Run BirdNET analysis (raw detections = multiple per species/time segment).
-    4) Sort raw detections by confidence (descending).
-    5) Group by `scientific_name`, keeping only the highest-confidence detection per species.
-    6) Return a list of Detection objects (one per species).
+    1) If `date` is None, use today's UTC date.
+    2) Decode the WAV bytes in memory and run BirdNET analysis (raw detections =
+       multiple per species/time segment).
+    3) Group by `scientific_name`, keeping only the highest-confidence detection per species.
+    4) Return a list of Detection objects (one per species), sorted by confidence.
     """
-    unique_name = f"{uuid.uuid4().hex}_stream.wav"
-    tmp_path = os.path.join(TMP_DIR, unique_name)
-    try:
-        with open(tmp_path, "wb") as out_f:
-            out_f.write(data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save stream data: {e}")
-
     if date is None:
         recording_date = datetime.now(timezone.utc).date()
     else:
         recording_date = date.date() if isinstance(date, datetime) else date
 
     try:
-        rec = Recording(
-            analyzer,
-            tmp_path,
-            lat=lat,
-            lon=lon,
-            date=recording_date,
-            min_conf=min_conf,
+        raw_detections = await _detect(
+            data, "stream.wav", lat, lon, recording_date, min_conf
         )
-        rec.analyze()
-        raw_detections: List[dict] = rec.detections
     except Exception as e:
-        os.remove(tmp_path)
         raise HTTPException(status_code=500, detail=f"BirdNET analysis failed: {e}")
 
-    os.remove(tmp_path)
-
-    sorted_detections = sorted(raw_detections, key=lambda d: d["confidence"], reverse=True)
-    best_per_species: dict[str, dict] = {}
-    for det in sorted_detections:
-        species = det["scientific_name"]
-        if species not in best_per_species:
-            best_per_species[species] = det
-
-    return [Detection(**det) for det in best_per_species.values()]
+    return [Detection.model_construct(**det) for det in _best_per_species(raw_detections, min_conf)]
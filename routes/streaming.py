@@ -1,11 +1,12 @@
 import os
+import math
 import wave
-import tempfile
 import asyncio
-from datetime import datetime, timezone, date as dtDate
+from datetime import datetime, timezone
 from typing import Annotated, Optional
 
-from birdnetlib import Recording
+import numpy as np
+import msgpack
 from fastapi import (
     APIRouter,
     WebSocket,
@@ -16,8 +17,9 @@ from fastapi import (
 )
 from pydantic import BaseModel, Field
 
-from deps import analyzer
+from audio import pcm16_to_float32
 from auth import EXPECTED_TOKEN
+from inference import run_birdnet_on_samples, run_inference
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,32 +31,8 @@ PERSISTENT_DIR = os.getenv("RAW_AUDIO_PATH", "/data/biodex/raw")
 os.makedirs(PERSISTENT_DIR, exist_ok=True)
 
 
-def write_temp_wav(
-    data: bytearray, sample_rate: int, channels: int, sample_width: int
-) -> str:
-    """
-    Creates a temporary WAV file with the provided PCM data and returns the file path.
-
-    Parameters:
-        data: Raw PCM byte buffer.
-        sample_rate: Sampling rate in Hz.
-        channels: Number of audio channels (1 = mono).
-        sample_width: Bytes per sample (2 for 16-bit PCM).
-
-    Returns:
-        The path to the created temporary WAV file.
-    """
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-        with wave.open(tmp, "wb") as wav_file:
-            wav_file.setnchannels(channels)
-            wav_file.setsampwidth(sample_width)
-            wav_file.setframerate(sample_rate)
-            wav_file.writeframes(data)
-        return tmp.name
-
-
 def write_persistent_wav(
-    data: bytes, sample_rate: int, channels: int, sample_width: int
+    data: bytes | bytearray | memoryview, sample_rate: int, channels: int, sample_width: int
 ) -> str:
     """
     Guarda el WAV completo en la carpeta persistente y devuelve la ruta.
@@ -75,27 +53,6 @@ def write_persistent_wav(
     return path
 
 
-def safe_remove(path: str):
-    """
-    Removes the specified file path if it exists. Logs a warning on failure.
-    """
-    try:
-        os.remove(path)
-    except Exception as e:
-        logger.warning("Failed to remove temporary file %s: %s", path, e)
-
-
-def run_birdnet_on_file(
-    file_path: str, lat: float, lon: float, date: dtDate, min_conf: float
-) -> list[dict]:
-    """
-    Runs BirdNET detection on a WAV file and returns a list of detection results.
-    """
-    rec = Recording(analyzer, file_path, lat=lat, lon=lon, date=date, min_conf=min_conf)
-    rec.analyze()
-    return rec.detections
-
-
 class RealtimeInit(BaseModel):
     lat: Annotated[
         float,
@@ -133,7 +90,8 @@ class RealtimeInit(BaseModel):
         Field(
             30.0,
             ge=1.0,
-            description="Max seconds to listen before timing out. Default 30 s.",
+            le=600.0,
+            description="Max seconds to listen before timing out (1–600). Default 30 s.",
         ),
     ] = Field(30.0)
 
@@ -158,11 +116,15 @@ async def websocket_realtime(
       1) Client connects to ws://<host>/ws/stream?token=<token>.
       2) Server checks the token; if it doesn't match, it closes with 1008.
       3) Client sends init JSON: {lat, lon, [date], [min_conf], [timeout]}.
-      4) Server accumulates PCM bytes (48 kHz, 16-bit LE, mono). Each time the buffer
-         reaches an additional 3 s (3 s, 6 s, 9 s, …), it runs BirdNET over the ENTIRE buffer
-         and sends a message with the detection (or an empty array if nothing is detected).
+      4) Server accumulates PCM bytes (48 kHz, 16-bit LE, mono). Each time another 3 s
+         segment is complete, it runs BirdNET over that NEW segment only, merges the
+         results into the best detection per species seen so far in the session, and
+         sends the merged list (or an empty array if nothing has been detected yet) as a
+         msgpack-encoded BINARY frame: {"detections": [...]}. Control and error
+         messages stay JSON text frames.
       5) If `timeout` seconds pass since init without the client closing, the server
-         sends {"timeout": true} and closes.
+         sends {"timeout": true} and closes. A client that sends more than `timeout`
+         seconds of audio gets an error and a 1009 close.
       6) If the client closes the WebSocket, the server also terminates.
     """
     await websocket.accept()
@@ -205,60 +167,88 @@ async def websocket_realtime(
     WINDOW_BYTES = (
         SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH * WINDOW_SECONDS
     )  # = 288000 bytes
-    # First window is 3 s (288000 bytes), then 6 s (576000 bytes), then 9 s, etc.
-
+    # Each window is the next 3 s (288000 bytes) that has not been analyzed yet.
+
+    # The session can't hold more audio than fits in `timeout` seconds. One extra
+    # window of slack covers clients that send each chunk before sleeping and so
+    # run slightly ahead of real time. The buffer itself only grows with the audio
+    # actually received.
+    capacity = (
+        math.ceil(timeout_seconds) * SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH
+        + WINDOW_BYTES
+    )
     buffer = bytearray()
-    start_time = datetime.now(timezone.utc)
-    next_window_bytes = WINDOW_BYTES  # first 3 s threshold
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_seconds
+    processed_bytes = 0  # bytes already handed to BirdNET
+    # Reused for every window: BirdNET is done with it before the next one starts.
+    samples = np.empty(WINDOW_BYTES // SAMPLE_WIDTH, dtype=np.float32)
+    best_per_species: dict[str, dict] = {}
 
     try:
         while True:
-            elapsed = (datetime.now(timezone.utc) - start_time).total_seconds()
-            if elapsed >= timeout_seconds:
+            # Waiting no longer than the deadline means any chunk received was
+            # sent in time; a wait that runs out is the session timeout.
+            remaining = deadline - loop.time()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                chunk = await asyncio.wait_for(
+                    websocket.receive_bytes(), timeout=remaining
+                )
+            except asyncio.TimeoutError:
                 await websocket.send_json({"timeout": True})
                 await websocket.close(code=status.WS_1000_NORMAL_CLOSURE)
                 return
-
-            try:
-                chunk = await asyncio.wait_for(websocket.receive_bytes(), timeout=1.0)
-            except asyncio.TimeoutError:
-                continue
             except WebSocketDisconnect:
                 return
 
-            buffer.extend(chunk)
+            if len(buffer) + len(chunk) > capacity:
+                await websocket.send_json(
+                    {"error": f"Stream exceeds {timeout_seconds:g} s of audio"}
+                )
+                await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+                return
+
+            buffer += chunk
             logger.debug(
                 "Received %d bytes, total buffer = %d bytes", len(chunk), len(buffer)
             )
 
-            if len(buffer) >= next_window_bytes:
-                logger.debug("Buffer ≥ %d → launching BirdNET", next_window_bytes)
+            while len(buffer) - processed_bytes >= WINDOW_BYTES:
+                offset_seconds = processed_bytes / (SAMPLE_RATE * SAMPLE_WIDTH)
+                logger.debug("New segment at %.1f s → launching BirdNET", offset_seconds)
 
-                try:
-                    wav_path = write_temp_wav(
-                        buffer[:next_window_bytes], SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH
-                    )
-                except Exception as e:
-                    await websocket.send_json({"error": f"I/O error: {e}"})
-                    await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
-                    return
+                window = np.frombuffer(
+                    buffer,
+                    dtype="<i2",
+                    count=WINDOW_BYTES // SAMPLE_WIDTH,
+                    offset=processed_bytes,
+                )
+                pcm16_to_float32(window, samples)
+                # The bytearray can't grow while an array still exports it.
+                del window
 
                 try:
-                    detections = run_birdnet_on_file(
-                        wav_path, lat, lon, recording_date, min_conf
+                    detections = await run_inference(
+                        run_birdnet_on_samples,
+                        samples,
+                        SAMPLE_RATE,
+                        lat,
+                        lon,
+                        recording_date,
+                        min_conf,
                     )
                 except Exception as e:
-                    safe_remove(wav_path)
                     await websocket.send_json({"error": f"BirdNET failed: {e}"})
                     await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
                     return
-                finally:
-                    safe_remove(wav_path)
 
                 logger.debug(
-                    "BirdNET returned %d detections for window %d s",
+                    "BirdNET returned %d detections for segment %.1f–%.1f s",
                     len(detections),
-                    next_window_bytes // WINDOW_BYTES,
+                    offset_seconds,
+                    offset_seconds + WINDOW_SECONDS,
                 )
                 for det in detections:
                     logger.debug(
@@ -266,21 +256,29 @@ async def websocket_realtime(
                         det["scientific_name"],
                         det["confidence"],
                     )
-
-                await websocket.send_json(
-                    {
-                        "detections": sorted(
-                            detections, key=lambda d: d["confidence"], reverse=True
-                        )
-                    }
+                    # Detection times are relative to the segment; shift them to
+                    # the session timeline before merging.
+                    det["start_time"] += offset_seconds
+                    det["end_time"] += offset_seconds
+                    species = det["scientific_name"]
+                    current = best_per_species.get(species)
+                    if current is None or det["confidence"] > current["confidence"]:
+                        best_per_species[species] = det
+
+                await websocket.send_bytes(
+                    msgpack.packb(
+                        {
+                            "detections": sorted(
+                                best_per_species.values(),
+                                key=lambda d: d["confidence"],
+                                reverse=True,
+                            )
+                        },
+                        use_bin_type=True,
+                    )
                 )
 
-                next_window_bytes += WINDOW_BYTES
-                logger.debug(
-                    "Next window will be %d bytes (%d s)",
-                    next_window_bytes,
-                    next_window_bytes // WINDOW_BYTES,
-                )
+                processed_bytes += WINDOW_BYTES
 
     except WebSocketDisconnect:
         return
@@ -290,5 +288,5 @@ async def websocket_realtime(
         return
     finally:
         if buffer:
-            write_persistent_wav(bytes(buffer), SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH)
+            write_persistent_wav(buffer, SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH)
         await websocket.close(code=status.WS_1000_NORMAL_CLOSURE)
@@ -1,5 +1,6 @@
 import asyncio
 import json
+import msgpack
 from pydub import AudioSegment
 import os
 from dotenv import load_dotenv
@@ -16,6 +17,12 @@ if not BEARER_TOKEN:
 
 AUDIO_FILE = "example.wav"
 
+def decode_message(msg):
+    # Detections arrive as msgpack binary frames; timeouts/errors as JSON text.
+    if isinstance(msg, bytes):
+        return msgpack.unpackb(msg, raw=False)
+    return json.loads(msg)
+
 async def realtime_client():
     uri = f"{WS_URL}?token={BEARER_TOKEN}"
     async with websockets.connect(uri) as ws:
@@ -49,7 +56,7 @@ async def realtime_client():
             await asyncio.sleep(0.5)
 
             try:
-                resp = await asyncio.wait_for(ws.recv(), timeout=0.1)
+                resp = decode_message(await asyncio.wait_for(ws.recv(), timeout=0.1))
                 print("Received:", resp)
                 return
             except asyncio.TimeoutError:
@@ -57,7 +64,7 @@ async def realtime_client():
 
         print("Finished streaming entire file; waiting for server to timeout…")
         try:
-            resp = await ws.recv()
+            resp = decode_message(await ws.recv())
             print("Received at end:", resp)
         except:
             pass